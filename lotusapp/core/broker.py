@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def canal_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+# Assinatura de um canal feita por uma conexão
+# Usa __slots__ e só cria o future de espera quando a conexão está ociosa,
+# para manter baixo o custo de milhares de conexões abertas ao mesmo tempo
+class Assinatura:
+    __slots__ = ('canal', 'loop', '_pendentes', '_espera')
+
+    def __init__(self, canal, loop, maximo_pendentes):
+        self.canal = canal
+        self.loop = loop
+        # Se o cliente não consumir, as mensagens mais antigas são descartadas
+        self._pendentes = deque(maxlen=maximo_pendentes)
+        self._espera = None
+
+    # Só pode ser chamado dentro do loop da assinatura
+    def entregar(self, mensagem):
+        self._pendentes.append(mensagem)
+        if self._espera is not None and not self._espera.done():
+            self._espera.set_result(None)
+
+    async def receber(self):
+        while not self._pendentes:
+            self._espera = self.loop.create_future()
+            try:
+                await self._espera
+            finally:
+                self._espera = None
+        return self._pendentes.popleft()
+
+
+# Interface dos brokers de notificações
+# Outras implementações (ex.: Redis, para vários processos) podem ser configuradas
+# em settings.NOTIFICACOES_BROKER
+class Broker:
+    def assinar(self, canal):
+        raise NotImplementedError
+
+    def cancelar(self, assinatura):
+        raise NotImplementedError
+
+    def publicar(self, canais, mensagem):
+        raise NotImplementedError
+
+
+# Broker em memória, válido apenas dentro de um processo
+# publicar() pode ser chamado de qualquer thread (ex.: views síncronas e signals)
+class BrokerEmMemoria(Broker):
+    def __init__(self, maximo_pendentes=None):
+        if maximo_pendentes is None:
+            maximo_pendentes = settings.NOTIFICACOES_MAXIMO_PENDENTES
+        self.maximo_pendentes = maximo_pendentes
+        self._assinaturas = {}
+        self._lock = threading.Lock()
+
+    def assinar(self, canal):
+        assinatura = Assinatura(canal, asyncio.get_running_loop(), self.maximo_pendentes)
+        with self._lock:
+            self._assinaturas.setdefault(canal, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.canal)
+            if assinaturas is None:
+                return
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del self._assinaturas[assinatura.canal]
+
+    def publicar(self, canais, mensagem):
+        # Agrupa os destinatários por loop para agendar uma única entrega por loop
+        por_loop = {}
+        with self._lock:
+            for canal in canais:
+                for assinatura in self._assinaturas.get(canal, ()):
+                    por_loop.setdefault(assinatura.loop, []).append(assinatura)
+
+        try:
+            loop_atual = asyncio.get_running_loop()
+        except RuntimeError:
+            loop_atual = None
+
+        for loop, assinaturas in por_loop.items():
+            if loop is loop_atual:
+                _entregar_todas(assinaturas, mensagem)
+                continue
+            try:
+                loop.call_soon_threadsafe(_entregar_todas, assinaturas, mensagem)
+            except RuntimeError:
+                # O loop já foi encerrado, então não há mais conexões para notificar
+                pass
+
+
+def _entregar_todas(assinaturas, mensagem):
+    for assinatura in assinaturas:
+        assinatura.entregar(mensagem)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obter_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.NOTIFICACOES_BROKER)()
+    return _broker
@@ -0,0 +1,85 @@
+import asyncio
+import re
+from contextlib import suppress
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.http.cookie import parse_cookie
+
+from .broker import canal_usuario, obter_broker
+
+ROTA_NOTIFICACOES = re.compile(r'^/ws/notificacoes/(?P<id>\d+)/?$')
+
+# Códigos de fechamento da aplicação (faixa 4000-4999 do protocolo WebSocket)
+CODIGO_NAO_AUTENTICADO = 4401
+CODIGO_PROIBIDO = 4403
+CODIGO_ROTA_INVALIDA = 4404
+
+
+# Aplicação ASGI para as conexões WebSocket de notificações
+# O usuário é autenticado pela sessão criada no login e só recebe os próprios eventos
+async def notificacoes(scope, receive, send):
+    mensagem = await receive()
+    if mensagem['type'] != 'websocket.connect':
+        return
+
+    correspondencia = ROTA_NOTIFICACOES.match(scope['path'])
+    if correspondencia is None:
+        await send({'type': 'websocket.close', 'code': CODIGO_ROTA_INVALIDA})
+        return
+
+    cabecalhos = {
+        nome.decode('latin-1'): valor.decode('latin-1') for nome, valor in scope['headers']
+    }
+
+    # Navegadores sempre enviam o Origin, o que impede outros sites de abrir a conexão
+    origem = cabecalhos.get('origin')
+    if origem is not None and origem not in settings.NOTIFICACOES_ORIGENS_PERMITIDAS:
+        await send({'type': 'websocket.close', 'code': CODIGO_PROIBIDO})
+        return
+
+    usuario = await usuario_da_sessao(cabecalhos.get('cookie', ''))
+    if not usuario.is_authenticated:
+        await send({'type': 'websocket.close', 'code': CODIGO_NAO_AUTENTICADO})
+        return
+    if usuario.id != int(correspondencia['id']):
+        await send({'type': 'websocket.close', 'code': CODIGO_PROIBIDO})
+        return
+
+    await atender_conexao(canal_usuario(usuario.id), receive, send)
+
+
+# Carrega o usuário da sessão do Django a partir do cookie da conexão
+async def usuario_da_sessao(cookie):
+    chave_sessao = parse_cookie(cookie).get(settings.SESSION_COOKIE_NAME)
+    sessao = import_module(settings.SESSION_ENGINE).SessionStore(chave_sessao)
+    return await aget_user(SimpleNamespace(session=sessao))
+
+
+# Aceita a conexão e repassa as mensagens do canal até o cliente desconectar
+async def atender_conexao(canal, receive, send):
+    await send({'type': 'websocket.accept'})
+
+    broker = obter_broker()
+    assinatura = broker.assinar(canal)
+    envio = asyncio.ensure_future(_enviar(assinatura, send))
+    try:
+        while True:
+            mensagem = await receive()
+            # Mensagens enviadas pelo cliente são ignoradas
+            if mensagem['type'] == 'websocket.disconnect':
+                break
+    finally:
+        broker.cancelar(assinatura)
+        envio.cancel()
+        # OSError: o servidor pode falhar ao enviar para um cliente já desconectado
+        with suppress(asyncio.CancelledError, OSError):
+            await envio
+
+
+async def _enviar(assinatura, send):
+    while True:
+        mensagem = await assinatura.receber()
+        await send({'type': 'websocket.send', 'text': mensagem})
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.broker import canal_usuario, obter_broker
+from core.consumers import atender_conexao
+
+# Quantidade de conexões abertas ao mesmo tempo no modo com servidor
+TAMANHO_LOTE_CONEXOES = 500
+
+
+# Memória residente (RSS) de um processo, em bytes (apenas Linux)
+def memoria_residente(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for linha in status:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1]) * 1024
+    except OSError as e:
+        raise CommandError(f'Não foi possível ler a memória do processo {pid}: {e}')
+    raise CommandError(f'Memória residente do processo {pid} não encontrada.')
+
+
+# Cliente WebSocket simulado, conversando direto com a aplicação ASGI
+class ClienteSimulado:
+    def __init__(self, teste):
+        self.teste = teste
+        self.desconectar = asyncio.get_running_loop().create_future()
+
+    async def receive(self):
+        await self.desconectar
+        return {'type': 'websocket.disconnect', 'code': 1000}
+
+    async def send(self, mensagem):
+        if mensagem['type'] == 'websocket.accept':
+            self.teste.registrar_conexao()
+        elif mensagem['type'] == 'websocket.send':
+            self.teste.registrar_entrega()
+
+
+class TesteCarga:
+    def __init__(self, total_clientes):
+        self.total_clientes = total_clientes
+        self.conectados = 0
+        self.entregas = 0
+        self.esperado = 0
+        self.todos_conectados = asyncio.Event()
+        self.todos_receberam = asyncio.Event()
+
+    def registrar_conexao(self):
+        self.conectados += 1
+        if self.conectados == self.total_clientes:
+            self.todos_conectados.set()
+
+    def registrar_entrega(self):
+        self.entregas += 1
+        if self.entregas == self.esperado:
+            self.todos_receberam.set()
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga das notificações. Sem --url, simula os clientes dentro do processo e '
+        'mede a memória da aplicação por conexão e a latência do fan-out; o custo do transporte '
+        '(uvicorn, websockets, sockets e buffers) não entra nessa medição. Com --url, abre '
+        'conexões WebSocket reais contra um uvicorn em execução e mede o RSS do servidor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=5000)
+        parser.add_argument('--eventos', type=int, default=20)
+        parser.add_argument(
+            '--url',
+            help='URL das notificações no servidor, ex.: ws://localhost:8000/ws/notificacoes/1/',
+        )
+        parser.add_argument('--cookie', default='', help='Cookie de sessão do usuário da URL')
+        parser.add_argument('--pid', type=int, help='PID do processo uvicorn, para medir o RSS')
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1:
+            raise CommandError('--clientes deve ser pelo menos 1.')
+        if options['url'] is None:
+            asyncio.run(self.executar(options['clientes'], options['eventos']))
+            return
+        if options['pid'] is None:
+            raise CommandError('Informe --pid do servidor para medir a memória.')
+        asyncio.run(
+            self.executar_com_servidor(
+                options['clientes'], options['url'], options['cookie'], options['pid']
+            )
+        )
+
+    async def executar(self, total_clientes, total_eventos):
+        teste = TesteCarga(total_clientes)
+        canais = [canal_usuario(i) for i in range(total_clientes)]
+
+        # Memória das conexões ociosas
+        tracemalloc.start()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        clientes = [ClienteSimulado(teste) for _ in range(total_clientes)]
+        conexoes = [
+            asyncio.ensure_future(atender_conexao(canal, cliente.receive, cliente.send))
+            for canal, cliente in zip(canais, clientes)
+        ]
+        await teste.todos_conectados.wait()
+        # Garante que todas as conexões chegaram à espera por mensagens
+        await asyncio.sleep(0)
+        memoria_conexoes = tracemalloc.get_traced_memory()[0] - memoria_inicial
+        memoria_por_conexao = memoria_conexoes / total_clientes
+        tracemalloc.stop()
+
+        self.stdout.write(f'Clientes conectados: {teste.conectados}')
+        self.stdout.write(
+            f'Memória da aplicação por conexão ociosa (sem o transporte): '
+            f'{memoria_por_conexao / 1024:.2f} KiB'
+        )
+
+        # Cada evento é publicado a partir de outra thread, como fazem os signals das views
+        broker = obter_broker()
+        latencias = []
+        for i in range(total_eventos):
+            mensagem = json.dumps({'evento': 'teste_carga', 'sequencia': i})
+            teste.todos_receberam.clear()
+            teste.esperado = teste.entregas + total_clientes
+            inicio = time.perf_counter()
+            await asyncio.to_thread(broker.publicar, canais, mensagem)
+            await teste.todos_receberam.wait()
+            latencias.append(time.perf_counter() - inicio)
+
+        for cliente in clientes:
+            cliente.desconectar.set_result(None)
+        await asyncio.gather(*conexoes)
+
+        if latencias:
+            media = sum(latencias) / len(latencias)
+            self.stdout.write(f'Mensagens entregues: {teste.entregas}')
+            self.stdout.write(f'Latência média do fan-out: {media * 1000:.2f} ms')
+            self.stdout.write(f'Latência máxima do fan-out: {max(latencias) * 1000:.2f} ms')
+            self.stdout.write(f'Vazão: {total_clientes / media:.0f} mensagens/s')
+        self.stdout.write(self.style.SUCCESS('Teste de carga concluído.'))
+
+    # Conexões reais: inclui o custo do uvicorn e do protocolo WebSocket no servidor
+    # Todas as conexões usam o mesmo usuário, então a latência do fan-out não é medida aqui
+    async def executar_com_servidor(self, total_clientes, url, cookie, pid):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import InvalidStatus
+
+        cabecalhos = {'Cookie': cookie} if cookie else {}
+        await asyncio.sleep(1)
+        memoria_inicial = memoria_residente(pid)
+
+        conexoes = []
+        try:
+            for inicio in range(0, total_clientes, TAMANHO_LOTE_CONEXOES):
+                lote = min(TAMANHO_LOTE_CONEXOES, total_clientes - inicio)
+                resultados = await asyncio.gather(
+                    *(connect(url, additional_headers=cabecalhos) for _ in range(lote)),
+                    return_exceptions=True,
+                )
+                # Guarda as conexões abertas do lote antes de tratar as falhas, para fechá-las
+                erros = [r for r in resultados if isinstance(r, BaseException)]
+                conexoes += [r for r in resultados if not isinstance(r, BaseException)]
+                if erros:
+                    if isinstance(erros[0], InvalidStatus):
+                        raise CommandError(
+                            'O servidor recusou a conexão '
+                            f'(HTTP {erros[0].response.status_code}). '
+                            'Verifique se o --cookie tem uma sessão válida do usuário da URL.'
+                        )
+                    raise erros[0]
+            # Espera o servidor terminar de registrar as conexões antes de medir
+            await asyncio.sleep(1)
+            memoria_conexoes = memoria_residente(pid) - memoria_inicial
+        finally:
+            await asyncio.gather(*(conexao.close() for conexao in conexoes))
+
+        self.stdout.write(f'Clientes conectados: {len(conexoes)}')
+        self.stdout.write(f'RSS do servidor antes das conexões: {memoria_inicial / 2**20:.1f} MiB')
+        self.stdout.write(
+            f'RSS do servidor por conexão ociosa: {memoria_conexoes / len(conexoes) / 1024:.2f} KiB'
+        )
+        self.stdout.write(self.style.SUCCESS('Teste de carga concluído.'))
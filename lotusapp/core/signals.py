@@ -0,0 +1,159 @@
+import json
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .broker import canal_usuario, obter_broker
+from .models import Aluno, Equipe, Notas, TentativaDiagnostico, Turma
+
+
+# Funções auxiliares para montar os destinatários das notificações
+def alunos_da_equipe(equipe_id):
+    return list(Aluno.objects.filter(equipes__id=equipe_id).values_list('usuario_id', flat=True))
+
+
+# Membros de várias equipes em uma única consulta, agrupados por equipe
+def alunos_das_equipes(equipes_ids):
+    membros = {equipe_id: [] for equipe_id in equipes_ids}
+    consulta = Aluno.objects.filter(equipes__id__in=equipes_ids).values_list(
+        'equipes__id', 'usuario_id'
+    )
+    for equipe_id, usuario_id in consulta:
+        membros[equipe_id].append(usuario_id)
+    return membros
+
+
+def professor_da_equipe(equipe_id):
+    # A chave primária do professor é o id do usuário
+    return list(
+        Turma.objects.filter(
+            equipes__id=equipe_id, professor_responsavel__isnull=False
+        ).values_list('professor_responsavel_id', flat=True)
+    )
+
+
+# A publicação só acontece depois do commit, para não notificar alterações desfeitas
+def notificar(usuarios_ids, evento, **dados):
+    if not usuarios_ids:
+        return
+    canais = [canal_usuario(usuario_id) for usuario_id in set(usuarios_ids)]
+    # A mensagem é serializada uma única vez e compartilhada por todas as conexões
+    mensagem = json.dumps({'evento': evento, **dados})
+    transaction.on_commit(lambda: obter_broker().publicar(canais, mensagem))
+
+
+# Notificações da equipe
+@receiver(pre_save, sender=Equipe)
+def guardar_caso_anterior(sender, instance, update_fields, **kwargs):
+    instance._caso_designado_anterior = None
+    # Evita a consulta quando o save não pode alterar o caso designado
+    if update_fields is not None and not {'caso_designado', 'caso_designado_id'} & update_fields:
+        instance._caso_designado_anterior = instance.caso_designado_id
+    elif instance.pk is not None:
+        anterior = Equipe.objects.filter(pk=instance.pk).values_list('caso_designado_id', flat=True)
+        instance._caso_designado_anterior = anterior.first()
+
+
+@receiver(post_save, sender=Equipe)
+def notificar_equipe(sender, instance, created, **kwargs):
+    if created:
+        return
+    if instance.caso_designado_id != getattr(instance, '_caso_designado_anterior', None):
+        evento = 'caso_designado'
+    else:
+        evento = 'equipe_atualizada'
+    notificar(
+        alunos_da_equipe(instance.id),
+        evento,
+        equipe=instance.id,
+        caso_designado=instance.caso_designado_id,
+    )
+
+
+# pre_delete porque os membros precisam ser lidos antes da exclusão em cascata
+@receiver(pre_delete, sender=Equipe)
+def notificar_equipe_removida(sender, instance, **kwargs):
+    notificar(alunos_da_equipe(instance.id), 'equipe_removida', equipe=instance.id)
+
+
+@receiver(m2m_changed, sender=Equipe.alunos.through)
+def notificar_membros_equipe(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse indica que a alteração partiu do aluno (aluno.equipes.add(...))
+    if action == 'pre_clear':
+        # Guarda o que será removido, pois depois do clear não há como consultar
+        if reverse:
+            instance._equipes_antes_clear = list(instance.equipes.values_list('id', flat=True))
+        else:
+            instance._alunos_antes_clear = alunos_da_equipe(instance.id)
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    # Os alunos removidos também precisam saber que saíram da equipe
+    if reverse:
+        if action == 'post_clear':
+            pk_set = instance._equipes_antes_clear
+        equipes = Equipe.objects.filter(id__in=pk_set).values_list('id', 'caso_designado_id')
+        removidos = [instance.usuario_id]
+    else:
+        equipes = [(instance.id, instance.caso_designado_id)]
+        # A chave primária do aluno é o id do usuário
+        removidos = instance._alunos_antes_clear if action == 'post_clear' else pk_set
+
+    equipes = list(equipes)
+    membros = alunos_das_equipes([equipe_id for equipe_id, _ in equipes])
+    for equipe_id, caso_designado_id in equipes:
+        notificar(
+            membros[equipe_id] + list(removidos),
+            'equipe_atualizada',
+            equipe=equipe_id,
+            caso_designado=caso_designado_id,
+        )
+
+
+# Notificações das tentativas de diagnóstico
+@receiver(post_save, sender=TentativaDiagnostico)
+def notificar_tentativa_diagnostico(sender, instance, created, **kwargs):
+    notificar(
+        alunos_da_equipe(instance.equipe_id) + professor_da_equipe(instance.equipe_id),
+        'tentativa_diagnostico',
+        tentativa=instance.id,
+        equipe=instance.equipe_id,
+        caso_clinico=instance.caso_clinico_id,
+        nova=created,
+    )
+
+
+@receiver(post_delete, sender=TentativaDiagnostico)
+def notificar_tentativa_removida(sender, instance, **kwargs):
+    notificar(
+        alunos_da_equipe(instance.equipe_id) + professor_da_equipe(instance.equipe_id),
+        'tentativa_diagnostico_removida',
+        tentativa=instance.id,
+        equipe=instance.equipe_id,
+        caso_clinico=instance.caso_clinico_id,
+    )
+
+
+# Notificações das notas
+@receiver(post_save, sender=Notas)
+def notificar_nota(sender, instance, created, **kwargs):
+    notificar(
+        alunos_da_equipe(instance.equipe_id),
+        'nota_publicada',
+        nota=instance.id,
+        equipe=instance.equipe_id,
+        valor=str(instance.valor),
+    )
+
+
+@receiver(post_delete, sender=Notas)
+def notificar_nota_removida(sender, instance, **kwargs):
+    notificar(
+        alunos_da_equipe(instance.equipe_id),
+        'nota_removida',
+        nota=instance.id,
+        equipe=instance.equipe_id,
+    )
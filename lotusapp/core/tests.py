@@ -1 +1,300 @@
-# Create your tests here.
+import asyncio
+import json
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .broker import Broker, BrokerEmMemoria, canal_usuario
+from .consumers import notificacoes
+from .models import (
+    Aluno,
+    CasoClinico,
+    Equipe,
+    Notas,
+    Professor,
+    TentativaDiagnostico,
+    Turma,
+    Usuario,
+)
+
+
+# Broker que apenas guarda as publicações, para inspecionar os signals
+class BrokerFalso(Broker):
+    def __init__(self):
+        self.publicacoes = []
+
+    def publicar(self, canais, mensagem):
+        self.publicacoes.append((set(canais), json.loads(mensagem)))
+
+
+def criar_aluno(numero):
+    usuario = Usuario.objects.create_user(
+        f'aluno{numero}', f'aluno{numero}@lotus.com', 'senha', first_name='Aluno', cpf=f'1{numero}'
+    )
+    return Aluno.objects.create(usuario=usuario, semestre='2025.1', matricula=f'm{numero}')
+
+
+def criar_professor():
+    usuario = Usuario.objects.create_user(
+        'professor', 'professor@lotus.com', 'senha', first_name='Professor', cpf='2'
+    )
+    return Professor.objects.create(usuario=usuario, formacao='Medicina', especialidade='Clínica')
+
+
+class NotificacoesSignalsTests(TestCase):
+    def setUp(self):
+        self.professor = criar_professor()
+        self.turma = Turma.objects.create(
+            disciplina='Clínica',
+            semestre='2025.1',
+            capacidade_maxima=10,
+            quantidade_alunos=2,
+            professor_responsavel=self.professor,
+        )
+        self.aluno1 = criar_aluno(1)
+        self.aluno2 = criar_aluno(2)
+        self.equipe = Equipe.objects.create(nome='Equipe 1', turma=self.turma)
+        self.equipe.alunos.set([self.aluno1, self.aluno2])
+        self.caso = CasoClinico.objects.create(titulo='Caso', descricao='Descrição', area='Área')
+
+        self.broker = BrokerFalso()
+        patcher = mock.patch('core.signals.obter_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def canais(self, *usuarios):
+        return {canal_usuario(usuario.usuario_id) for usuario in usuarios}
+
+    def test_designar_caso_notifica_caso_designado(self):
+        self.equipe.caso_designado = self.caso
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.save()
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+        self.assertEqual(mensagem['evento'], 'caso_designado')
+        self.assertEqual(mensagem['caso_designado'], self.caso.id)
+
+    def test_alterar_equipe_sem_caso_notifica_equipe_atualizada(self):
+        self.equipe.nome = 'Equipe A'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.save()
+
+        self.assertEqual(self.broker.publicacoes[-1][1]['evento'], 'equipe_atualizada')
+
+    def test_save_sem_caso_em_update_fields_nao_consulta_caso_anterior(self):
+        self.equipe.nome = 'Equipe A'
+        with self.captureOnCommitCallbacks(execute=True):
+            # Apenas o UPDATE e a consulta dos alunos para notificar
+            with self.assertNumQueries(2):
+                self.equipe.save(update_fields=['nome'])
+
+        self.assertEqual(self.broker.publicacoes[-1][1]['evento'], 'equipe_atualizada')
+
+    def test_adicionar_aluno_notifica_todos_os_membros(self):
+        aluno3 = criar_aluno(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.alunos.add(aluno3)
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2, aluno3))
+        self.assertEqual(mensagem['equipe'], self.equipe.id)
+
+    def test_adicionar_pelo_aluno_notifica_membros_com_mesmo_formato(self):
+        aluno3 = criar_aluno(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            aluno3.equipes.add(self.equipe)
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2, aluno3))
+        self.assertEqual(
+            mensagem,
+            {'evento': 'equipe_atualizada', 'equipe': self.equipe.id, 'caso_designado': None},
+        )
+
+    def test_remover_aluno_notifica_removido(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.alunos.remove(self.aluno2)
+
+        canais, _ = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+
+    def test_limpar_equipe_notifica_removidos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.alunos.clear()
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+        self.assertEqual(mensagem['equipe'], self.equipe.id)
+
+    def test_limpar_pelo_aluno_notifica_equipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aluno2.equipes.clear()
+
+        canais, _ = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+
+    def test_limpar_pelo_aluno_nao_consulta_uma_vez_por_equipe(self):
+        def consultas_ao_limpar(aluno):
+            with CaptureQueriesContext(connection) as contexto:
+                aluno.equipes.clear()
+            return len(contexto)
+
+        uma_equipe = consultas_ao_limpar(self.aluno1)
+        for numero in range(3):
+            equipe = Equipe.objects.create(nome=f'Equipe {numero}', turma=self.turma)
+            equipe.alunos.add(self.aluno2)
+        self.assertEqual(consultas_ao_limpar(self.aluno2), uma_equipe)
+
+    def test_tentativa_notifica_equipe_e_professor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TentativaDiagnostico.objects.create(
+                descricao='Hipótese', caso_clinico=self.caso, equipe=self.equipe
+            )
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2, self.professor))
+        self.assertEqual(mensagem['evento'], 'tentativa_diagnostico')
+
+    def test_tentativa_busca_professor_em_uma_consulta(self):
+        # INSERT, alunos da equipe e professor da turma
+        with self.assertNumQueries(3):
+            TentativaDiagnostico.objects.create(
+                descricao='Hipótese', caso_clinico=self.caso, equipe=self.equipe
+            )
+
+    def test_nota_notifica_equipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notas.objects.create(valor='9.5', equipe=self.equipe)
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+        self.assertEqual(mensagem['evento'], 'nota_publicada')
+        self.assertEqual(mensagem['valor'], '9.5')
+
+    def test_remover_nota_notifica_equipe(self):
+        nota = Notas.objects.create(valor='9.5', equipe=self.equipe)
+        nota_id = nota.id
+        with self.captureOnCommitCallbacks(execute=True):
+            nota.delete()
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+        self.assertEqual(mensagem['evento'], 'nota_removida')
+        self.assertEqual(mensagem['nota'], nota_id)
+
+    def test_remover_tentativa_notifica_equipe_e_professor(self):
+        tentativa = TentativaDiagnostico.objects.create(
+            descricao='Hipótese', caso_clinico=self.caso, equipe=self.equipe
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            tentativa.delete()
+
+        canais, mensagem = self.broker.publicacoes[-1]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2, self.professor))
+        self.assertEqual(mensagem['evento'], 'tentativa_diagnostico_removida')
+
+    def test_remover_equipe_notifica_membros(self):
+        Notas.objects.create(valor='9.5', equipe=self.equipe)
+        equipe_id = self.equipe.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.delete()
+
+        removidas = [m for _, m in self.broker.publicacoes if m['evento'] == 'equipe_removida']
+        self.assertEqual(removidas, [{'evento': 'equipe_removida', 'equipe': equipe_id}])
+        canais = [c for c, m in self.broker.publicacoes if m['evento'] == 'equipe_removida'][0]
+        self.assertEqual(canais, self.canais(self.aluno1, self.aluno2))
+
+    def test_nada_e_publicado_sem_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            Notas.objects.create(valor='7.0', equipe=self.equipe)
+
+        self.assertEqual(self.broker.publicacoes, [])
+
+
+class BrokerEmMemoriaTests(SimpleTestCase):
+    async def test_publicar_de_outra_thread(self):
+        broker = BrokerEmMemoria(maximo_pendentes=10)
+        assinatura = broker.assinar('canal')
+
+        await asyncio.to_thread(broker.publicar, ['canal', 'outro'], 'mensagem')
+
+        self.assertEqual(await asyncio.wait_for(assinatura.receber(), 1), 'mensagem')
+
+    async def test_descarta_mensagens_antigas_acima_do_maximo(self):
+        broker = BrokerEmMemoria(maximo_pendentes=2)
+        assinatura = broker.assinar('canal')
+
+        for mensagem in ('a', 'b', 'c'):
+            broker.publicar(['canal'], mensagem)
+
+        self.assertEqual(await assinatura.receber(), 'b')
+        self.assertEqual(await assinatura.receber(), 'c')
+
+    async def test_cancelar_para_de_entregar(self):
+        broker = BrokerEmMemoria(maximo_pendentes=10)
+        assinatura = broker.assinar('canal')
+
+        broker.cancelar(assinatura)
+        broker.publicar(['canal'], 'mensagem')
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(assinatura.receber(), 0.05)
+
+
+class NotificacoesConsumerTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_aluno(1).usuario
+        self.client.force_login(self.usuario)
+        self.cookie = f'sessionid={self.client.cookies["sessionid"].value}'
+
+    async def conectar(self, usuario_id, cabecalhos):
+        eventos = asyncio.Queue()
+        await eventos.put({'type': 'websocket.connect'})
+        await eventos.put({'type': 'websocket.disconnect', 'code': 1000})
+        enviadas = []
+
+        async def send(mensagem):
+            enviadas.append(mensagem)
+
+        scope = {
+            'type': 'websocket',
+            'path': f'/ws/notificacoes/{usuario_id}/',
+            'headers': [(nome.encode(), valor.encode()) for nome, valor in cabecalhos],
+        }
+        await notificacoes(scope, eventos.get, send)
+        return enviadas[0]
+
+    async def test_aceita_sessao_do_proprio_usuario(self):
+        resposta = await self.conectar(self.usuario.id, [('cookie', self.cookie)])
+        self.assertEqual(resposta, {'type': 'websocket.accept'})
+
+    async def test_recusa_sem_sessao(self):
+        resposta = await self.conectar(self.usuario.id, [])
+        self.assertEqual(resposta['code'], 4401)
+
+    async def test_recusa_outro_usuario(self):
+        resposta = await self.conectar(self.usuario.id + 1, [('cookie', self.cookie)])
+        self.assertEqual(resposta['code'], 4403)
+
+    async def test_recusa_origem_nao_permitida(self):
+        resposta = await self.conectar(
+            self.usuario.id, [('cookie', self.cookie), ('origin', 'https://outro.site')]
+        )
+        self.assertEqual(resposta['code'], 4403)
+
+    @override_settings(NOTIFICACOES_ORIGENS_PERMITIDAS=['https://lotus.app'])
+    async def test_aceita_origem_permitida(self):
+        resposta = await self.conectar(
+            self.usuario.id, [('cookie', self.cookie), ('origin', 'https://lotus.app')]
+        )
+        self.assertEqual(resposta, {'type': 'websocket.accept'})
+
+
+class TesteCargaNotificacoesTests(SimpleTestCase):
+    def test_recusa_zero_clientes(self):
+        with self.assertRaisesMessage(CommandError, '--clientes'):
+            call_command('teste_carga_notificacoes', clientes=0)
@@ -1,6 +1,7 @@
 import json
 
 from django.contrib.auth import authenticate
+from django.contrib.auth import login as auth_login
 from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -115,6 +116,8 @@ def login(request):
         usuario = authenticate(request, username=email, password=senha_fornecida)
 
         if usuario is not None:
+            # Cria a sessão, usada também para autenticar as notificações em tempo real
+            auth_login(request, usuario)
             user_data_response = {
                 'id': usuario.id,
                 'first_name': usuario.first_name,
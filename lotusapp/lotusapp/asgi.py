@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lotusapp.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importado depois do setup do Django, pois depende dos models
+from core.consumers import notificacoes  # noqa: E402
+
+
+# Conexões WebSocket vão para as notificações, o resto é tratado pelo Django
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await notificacoes(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -77,6 +77,17 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'lotusapp.wsgi.application'
 
+ASGI_APPLICATION = 'lotusapp.asgi.application'
+
+# Notificações em tempo real (WebSocket)
+# Broker usado para distribuir os eventos entre as conexões abertas
+NOTIFICACOES_BROKER = 'core.broker.BrokerEmMemoria'
+# Máximo de mensagens guardadas por conexão enquanto o cliente não as consome
+NOTIFICACOES_MAXIMO_PENDENTES = 100
+# Origens de navegador aceitas nas conexões WebSocket (independente das configurações de CORS)
+# Clientes sem o cabeçalho Origin, como o app mobile, não são afetados
+NOTIFICACOES_ORIGENS_PERMITIDAS = []
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases